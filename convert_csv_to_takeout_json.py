@@ -2,16 +2,36 @@
 import argparse
 import csv
 import json
+import os
 import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 # A regex to validate and extract an 11-character YouTube video ID.
 YOUTUBE_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+# A more lenient variant to find IDs inside URLs or other text.
+YOUTUBE_ID_SEARCH_RE = re.compile(r"[A-Za-z0-9_-]{11}")
+
+# Accepted header names for each column, lowercased, in order of preference.
+ID_COLUMNS = ("video id", "videoid", "id")
+URL_COLUMNS = ("video url", "url", "link")
+TITLE_COLUMNS = ("video title", "title", "song", "track", "name")
 
 VERBOSE = False  # Set from CLI flag
 
+# Per-directory record of converted CSVs, used to skip unchanged files on re-runs.
+# Deliberately not named *.json so the downloader never mistakes it for a playlist.
+CACHE_FILENAME = ".ymde_csv_cache"
+
+# Conditional import of orjson for faster JSON writes (optional dependency)
+try:  # noqa: SIM105
+    import orjson  # type: ignore
+except Exception:
+    orjson = None  # type: ignore
+
 def log(msg: str) -> None:
     """Print normal output to stdout."""
     print(msg, flush=True)
@@ -30,97 +50,147 @@ def coerce_str(value: Any) -> Optional[str]:
     s = str(value or "").strip()
     return s if s else None
 
-def find_key(row: Dict[str, Any], candidates: Iterable[str]) -> Optional[str]:
-    """Finds the first matching key from a list of candidates in a dictionary, case-insensitively."""
-    lower_keys = {k.lower(): k for k in row.keys()}
+def find_column(header: List[str], candidates: Iterable[str]) -> Optional[int]:
+    """Finds the index of the first matching column from lowercased candidates, case-insensitively."""
+    lower_idx = {h.lower(): i for i, h in enumerate(header)}
     for c in candidates:
-        if c.lower() in lower_keys:
-            return lower_keys[c.lower()]
+        if c in lower_idx:
+            return lower_idx[c]
     return None
 
-def row_get(row: Dict[str, Any], candidates: Iterable[str]) -> Optional[str]:
-    """Gets a value from a row by trying multiple possible key names."""
-    key = find_key(row, candidates)
-    return coerce_str(row.get(key)) if key else None
+def cell(row: List[str], idx: Optional[int]) -> Optional[str]:
+    """Gets a stripped value from a row for a pre-resolved column index."""
+    if idx is None or idx >= len(row):
+        return None
+    return coerce_str(row[idx])
 
-def extract_video_id(row: Dict[str, Any]) -> Optional[str]:
+def extract_video_id(row: List[str], id_idx: Optional[int]) -> Optional[str]:
     """
     Extracts a YouTube video ID from a CSV row.
-    It first checks common ID columns, then falls back to searching all values in the row.
+    It first checks the resolved ID column, then falls back to searching all values in the row.
     """
-    # 1. Try dedicated ID columns first for an exact match.
-    vid = row_get(row, ["Video ID", "VideoId", "Id"])
+    # 1. Try the dedicated ID column first for an exact match.
+    vid = cell(row, id_idx)
     if vid and YOUTUBE_ID_RE.fullmatch(vid):
         return vid
         
-    # 2. If not found, search all string values in the row for a potential ID.
-    for value in row.values():
-        s = coerce_str(value)
-        if s:
-            # This regex is more lenient to find IDs inside URLs or other text.
-            m = re.search(r"[A-Za-z0-9_-]{11}", s)
-            if m:
-                return m.group(0)
-    return None
+    # 2. If not found, search all values in the row for a potential ID in one pass.
+    # The separator is not part of the ID alphabet, so matches never span cells.
+    m = YOUTUBE_ID_SEARCH_RE.search("\x1f".join(row))
+    return m.group(0) if m else None
+
+def dumps_json(obj: Any) -> bytes:
+    """Serializes an object to compact UTF-8 JSON, using orjson when available."""
+    if orjson:
+        return orjson.dumps(obj)
+    # Compact separators, so the output is byte-for-byte the same as orjson's
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
 
 def convert_csv_file(csv_path: Path, remove_suffix: bool) -> Optional[Path]:
     """
     Converts a single CSV playlist file to the target JSON format.
     Returns the path to the new .json file on success, otherwise None.
+
+    Rows are streamed straight into the output file, one track per line, so
+    memory use stays flat regardless of the playlist size. The JSON is written
+    to a temporary file first and only moved into place once it is complete.
     """
+    playlist_name = csv_path.stem
+    if remove_suffix and playlist_name.lower().endswith("-videos"):
+        playlist_name = playlist_name[:-7].strip()
+
+    out_path = csv_path.with_suffix(".json")
+    tmp_path = out_path.with_name(out_path.name + ".part")
+    row_count = 0
+    track_count = 0
     try:
-        with csv_path.open("r", encoding="utf-8-sig", newline="") as f:
-            reader = csv.DictReader(f)
-            rows = list(reader)
-    except Exception as e:
+        f = csv_path.open("r", encoding="utf-8-sig", newline="")
+    except OSError as e:
         eprint(f"[WARN] Failed to read CSV {csv_path.name}: {e}")
         return None
+    try:
+        with f, tmp_path.open("wb") as out:
+            reader = csv.reader(f)
+            header = next(reader, None) or []
 
-    if not rows:
-        eprint(f"[INFO] Empty or invalid CSV: {csv_path.name}, skipping.")
-        return None
+            # Every row shares the same header, so resolve the candidate columns once.
+            id_idx = find_column(header, ID_COLUMNS)
+            url_idx = find_column(header, URL_COLUMNS)
+            title_idx = find_column(header, TITLE_COLUMNS)
 
-    tracks: List[Dict[str, Any]] = []
-    vlog(f"Parsing CSV: {csv_path.name} ({len(rows)} rows)")
-    for i, row in enumerate(rows):
-        video_id = extract_video_id(row)
-        if not video_id:
-            eprint(f"[WARN] No video ID found in row {i+1} of {csv_path.name}")
-            continue
-            
-        url = row_get(row, ["Video URL", "URL", "Link"]) or f"https://music.youtube.com/watch?v={video_id}"
-        title = row_get(row, ["Video Title", "Title", "Song", "Track", "Name"])
-
-        tracks.append({
-            "title": title or "Unknown Title",
-            "url": url,
-            "videoId": video_id,
-            "source": "csv"
-        })
-
-    if not tracks:
-        eprint(f"[INFO] No valid tracks parsed from {csv_path.name}, skipping.")
-        return None
+            vlog(f"Parsing CSV: {csv_path.name}")
+            out.write(b'{\n  "type": "playlist",\n  "name": ' + dumps_json(playlist_name) + b',\n  "tracks": [')
+            for row in reader:
+                # Like csv.DictReader, ignore blank lines between records.
+                if not row:
+                    continue
+                row_count += 1
+                video_id = extract_video_id(row, id_idx)
+                if not video_id:
+                    eprint(f"[WARN] No video ID found in row {row_count} of {csv_path.name}")
+                    continue
 
-    playlist_name = csv_path.stem
-    if remove_suffix and playlist_name.lower().endswith("-videos"):
-        playlist_name = playlist_name[:-7].strip()
+                url = cell(row, url_idx) or f"https://music.youtube.com/watch?v={video_id}"
+                title = cell(row, title_idx)
 
-    out_obj = {
-        "type": "playlist",
-        "name": playlist_name,
-        "tracks": tracks,
-    }
+                out.write((b",\n    " if track_count else b"\n    ") + dumps_json({
+                    "title": title or "Unknown Title",
+                    "url": url,
+                    "videoId": video_id,
+                    "source": "csv"
+                }))
+                track_count += 1
+            out.write(b"\n  ]\n}\n")
+    except (csv.Error, UnicodeDecodeError) as e:
+        eprint(f"[WARN] Failed to read CSV {csv_path.name}: {e}")
+        tmp_path.unlink(missing_ok=True)
+        return None
+    except Exception as e:
+        eprint(f"[ERR] Failed to write JSON {out_path.name}: {e}")
+        tmp_path.unlink(missing_ok=True)
+        return None
+
+    if not track_count:
+        tmp_path.unlink(missing_ok=True)
+        if not row_count:
+            eprint(f"[INFO] Empty or invalid CSV: {csv_path.name}, skipping.")
+        else:
+            eprint(f"[INFO] No valid tracks parsed from {csv_path.name}, skipping.")
+        return None
 
-    out_path = csv_path.with_suffix(".json")
     try:
-        with out_path.open("w", encoding="utf-8") as f:
-            json.dump(out_obj, f, ensure_ascii=False, indent=2)
-        log(f"[OK] Converted CSV -> JSON: {csv_path.name} -> {out_path.name} ({len(tracks)} tracks)")
-        return out_path
+        os.replace(tmp_path, out_path)
     except Exception as e:
         eprint(f"[ERR] Failed to write JSON {out_path.name}: {e}")
+        tmp_path.unlink(missing_ok=True)
         return None
+    log(f"[OK] Converted CSV -> JSON: {csv_path.name} -> {out_path.name} ({track_count} tracks)")
+    return out_path
+
+def load_conversion_cache(directory: Path) -> Dict[str, List[Any]]:
+    """Loads the conversion cache of a directory, or an empty one if missing or unreadable."""
+    try:
+        data = json.loads((directory / CACHE_FILENAME).read_text(encoding="utf-8"))
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+def save_conversion_cache(directory: Path, cache: Dict[str, List[Any]]) -> None:
+    """Writes the conversion cache of a directory (non-fatal on failure)."""
+    try:
+        (directory / CACHE_FILENAME).write_text(json.dumps(cache, indent=2), encoding="utf-8")
+    except Exception as e:
+        eprint(f"[WARN] Failed to write conversion cache in {directory}: {e}")
+
+def csv_fingerprint(csv_path: Path, remove_suffix: bool) -> List[Any]:
+    """Returns the values that must match for a previous conversion to be reused."""
+    st = csv_path.stat()
+    return [st.st_mtime_ns, st.st_size, remove_suffix]
+
+def _init_worker(verbose: bool) -> None:
+    """Propagates the --verbose setting into conversion worker processes."""
+    global VERBOSE
+    VERBOSE = verbose
 
 def main() -> int:
     """Main entrypoint for the CSV conversion script."""
@@ -148,10 +218,45 @@ def main() -> int:
 
     log(f"Found {len(csv_files)} CSV file(s) to process...")
     count = 0
+    caches: Dict[Path, Dict[str, List[Any]]] = {}
+    pending: List[Tuple[Path, List[Any]]] = []
     for p in csv_files:
-        if p.is_file():
-            if convert_csv_file(p, args.remove_videos_suffix):
+        if not p.is_file():
+            continue
+        cache = caches.get(p.parent)
+        if cache is None:
+            cache = caches[p.parent] = load_conversion_cache(p.parent)
+        try:
+            fingerprint = csv_fingerprint(p, args.remove_videos_suffix)
+        except OSError as e:
+            eprint(f"[WARN] Failed to read CSV {p.name}: {e}")
+            continue
+        if cache.get(p.name) == fingerprint and p.with_suffix(".json").is_file():
+            log(f"[SKIP] Unchanged since last conversion: {p.name}")
+            count += 1
+            continue
+        pending.append((p, fingerprint))
+
+    if pending:
+        # Each file converts independently, so spread them across CPU cores.
+        files = [p for p, _ in pending]
+        convert = partial(convert_csv_file, remove_suffix=args.remove_videos_suffix)
+        workers = max(1, min(len(files), os.cpu_count() or 1))
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(VERBOSE,)) as ex:
+            # One file per task for the usual handful of CSVs; batch only when there are many
+            results = list(ex.map(convert, files, chunksize=max(1, len(files) // (workers * 4))))
+
+        # Record the outcome in the main process so workers never race on a cache file.
+        changed = set()
+        for (p, fingerprint), out in zip(pending, results):
+            if out:
                 count += 1
+                caches[p.parent][p.name] = fingerprint
+            else:
+                caches[p.parent].pop(p.name, None)
+            changed.add(p.parent)
+        for directory in changed:
+            save_conversion_cache(directory, caches[directory])
 
     log(f"[DONE] Successfully converted {count} of {len(csv_files)} CSV file(s).")
     return 0
@@ -9,7 +9,7 @@ TAKEOUT_PATH="${TAKEOUT_PATH:-/data}"
 OUTPUT_DIR="${OUTPUT_DIR:-/library}"
 AUDIO_FORMAT="${AUDIO_FORMAT:-m4a}"
 QUALITY="${QUALITY:-0}"
-CONCURRENCY="${CONCURRENCY:-4}"
+CONCURRENCY="${CONCURRENCY:-}" # Empty: half the usable CPUs, between 2 and 8
 WRITE_M3U="${WRITE_M3U:-1}"
 REMOVE_VIDEOS_SUFFIX="${REMOVE_VIDEOS_SUFFIX:-1}"
 PREFER_YOUTUBE_MUSIC="${PREFER_YOUTUBE_MUSIC:-1}"
@@ -21,6 +21,8 @@ TRIM_NON_MUSIC="${TRIM_NON_MUSIC:-0}"
 SPONSORBLOCK_CATEGORIES="${SPONSORBLOCK_CATEGORIES:-}" # Optional custom list
 RETRY_SEARCH_IF_UNAVAILABLE="${RETRY_SEARCH_IF_UNAVAILABLE:-1}" # Enable fallback search by default
 FALLBACK_MAX_RESULTS="${FALLBACK_MAX_RESULTS:-6}" # Number of search results to consider for replacement
+EMBED_THUMBNAILS="${EMBED_THUMBNAILS:-1}" # Embed cover art by default in the container
+RESCAN_LIBRARY="${RESCAN_LIBRARY:-0}" # Ignore the saved library index and rescan every folder
 
 # 1. Convert CSVs to JSON
 # Build arguments for the conversion script
@@ -38,7 +40,9 @@ ARGS+=("$TAKEOUT_PATH")
 ARGS+=("-o" "$OUTPUT_DIR")
 ARGS+=("--audio-format" "$AUDIO_FORMAT")
 ARGS+=("--quality" "$QUALITY")
-ARGS+=("--concurrency" "$CONCURRENCY")
+if [[ -n "$CONCURRENCY" ]]; then
+  ARGS+=("--concurrency" "$CONCURRENCY")
+fi
 
 # Apply a default rate limit if no cookies are used, to be safer against IP bans.
 # The user can override this by setting RATE_LIMIT to a value or an empty string.
@@ -63,12 +67,18 @@ fi
 if [[ "$PREFER_YOUTUBE_MUSIC" == "1" ]]; then
   ARGS+=("--prefer-youtube-music")
 fi
+if [[ "$EMBED_THUMBNAILS" == "1" ]]; then
+  ARGS+=("--thumbnails")
+fi
 if [[ "$WRITE_M3U" == "1" ]]; then
   ARGS+=("--write-m3u")
 fi
 if [[ "$DRY_RUN" == "1" ]]; then
   ARGS+=("--dry-run")
 fi
+if [[ "$RESCAN_LIBRARY" == "1" ]]; then
+  ARGS+=("--rescan")
+fi
 if [[ "$REMOVE_VIDEOS_SUFFIX" == "1" ]]; then
   ARGS+=("--remove-videos-suffix")
 fi
@@ -1,14 +1,17 @@
 #!/usr/bin/env python3
 import argparse
 import json
+import os
 import re
 import subprocess
 import sys
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
 import shlex
+import string
 import math
 
 # Failure categories for optional future reporting (simple heuristics)
@@ -18,6 +21,81 @@ FAIL_REGION = "region_blocked"
 FAIL_UNAVAILABLE = "unavailable"
 FAIL_OTHER = "other"
 
+# Parsed --sleep value: (seconds, None) for a fixed sleep, or (min, max) for a random range
+SleepInterval = Tuple[float, Optional[float]]
+
+# Choices for --audio-format (yt-dlp's -x --audio-format values)
+AUDIO_FORMATS = ("flac", "alac", "wav", "aiff", "opus", "vorbis", "aac", "m4a", "mp3", "ac4", "eac3", "ac3", "dts")
+
+# Skippable SponsorBlock categories allowed in --sb-categories, plus yt-dlp's "all"/"default"
+# aliases. The non-skippable ones (chapter, poi_highlight) are left out on purpose: yt-dlp's
+# --sponsorblock-remove rejects them, which would fail every download.
+SPONSORBLOCK_CATEGORIES = frozenset({
+    "sponsor", "intro", "outro", "selfpromo", "preview", "filler", "interaction",
+    "music_offtopic", "hook", "all", "default",
+})
+DEFAULT_SB_CATEGORIES = "sponsor,intro,outro,selfpromo,music_offtopic"
+
+# Minimum seconds between progress bar postfix (ETA) refreshes
+PROGRESS_UPDATE_INTERVAL = 0.25
+
+# Precompiled patterns used on per-track paths
+VIDEO_URL_ID_RE = re.compile(r"(?:youtube\.com|youtu\.be).*?([A-Za-z0-9_-]{11})")
+# Markers directly followed by the video ID in watch and short links ("&v=" covers
+# watch URLs where a list= or other parameter comes first)
+VIDEO_ID_MARKERS = ("?v=", "&v=", "youtu.be/")
+# Scheme and host prefixes of the YouTube links the marker fast path is trusted for;
+# any other URL goes through VIDEO_URL_ID_RE, which requires a YouTube host
+YOUTUBE_URL_PREFIXES = tuple(
+    scheme + host
+    for scheme in ("https://", "http://", "")
+    for host in ("www.youtube.com/", "youtube.com/", "music.youtube.com/", "m.youtube.com/", "youtu.be/")
+)
+# Characters allowed in an 11-char video ID
+YOUTUBE_ID_CHARS = frozenset(string.ascii_letters + string.digits + "-_")
+# Extensions yt-dlp can produce for the supported --audio-format choices (plus a few
+# containers it may leave behind); checked before the regex so M3U/JSON/image files are skipped cheaply
+AUDIO_EXTENSIONS = (
+    ".m4a", ".mp3", ".opus", ".ogg", ".flac", ".wav", ".aiff", ".aac",
+    ".ac4", ".eac3", ".ac3", ".dts", ".webm", ".mka",
+)
+# The 11-char ID in brackets just before the extension of a downloaded file
+LIBRARY_FILE_ID_RE = re.compile(r"\[([A-Za-z0-9_-]{11})\]\.[^.]+$")
+COUNTRY_CODE_RE = re.compile(r"[A-Z]{2,3}")
+# Country list in a region-lock error: "This video is available in Country1, Country2."
+AVAILABLE_IN_MARKER = "available in "
+# Country hints tried with --xff before giving up on a region-locked track
+MAX_REGION_RETRIES = 5
+# Country names the initials/first-letters heuristic gets wrong (lowercased name -> code)
+COUNTRY_NAME_CODES = {
+    "united states": "US", "united kingdom": "GB", "south korea": "KR", "south africa": "ZA",
+    "new zealand": "NZ", "united arab emirates": "AE", "saudi arabia": "SA",
+    "czech republic": "CZ", "czechia": "CZ", "hong kong": "HK", "puerto rico": "PR",
+    "germany": "DE", "spain": "ES", "japan": "JP", "switzerland": "CH", "austria": "AT",
+    "sweden": "SE", "denmark": "DK", "ireland": "IE", "portugal": "PT", "mexico": "MX",
+    "china": "CN", "taiwan": "TW", "ukraine": "UA", "turkey": "TR", "croatia": "HR",
+    "slovakia": "SK", "slovenia": "SI", "latvia": "LV", "lithuania": "LT",
+    "estonia": "EE", "iceland": "IS", "greece": "GR", "argentina": "AR", "chile": "CL",
+    "peru": "PE", "colombia": "CO", "venezuela": "VE", "malaysia": "MY",
+    "singapore": "SG", "vietnam": "VN", "indonesia": "ID", "philippines": "PH",
+    "pakistan": "PK", "bangladesh": "BD", "nigeria": "NG", "kenya": "KE", "egypt": "EG",
+    "morocco": "MA", "algeria": "DZ", "serbia": "RS", "montenegro": "ME",
+}
+# Used by the fallback search to clean and compare titles
+# Bracketed/parenthetical parts with the whitespace around them, or any other whitespace run
+TITLE_NOISE_RE = re.compile(r"(?:\s*[\[(].*?[\])])+\s*|\s+")
+TOKEN_SPLIT_RE = re.compile(r"[^a-z0-9]+")
+UNSAFE_FILENAME_RE = re.compile(r'[\\/*?:"<>|]')
+# Library index written by the previous run, used to skip rescanning unchanged folders.
+# Deliberately not named *.json, like the converter's cache.
+INDEX_FILENAME = ".ymde_index"
+
+# Maps the native path separator to "/" for M3U entries (identity on POSIX).
+M3U_SEP_TRANS = str.maketrans(os.sep, "/")
+
+# Deletes basic ASCII letters, so the length difference counts them in one C-level pass.
+ASCII_LETTERS_DELETE = str.maketrans("", "", string.ascii_letters)
+
 """YouTube Music Takeout Downloader.
 
 Simplified logging: normal output to stdout, warnings/errors to stderr.
@@ -36,6 +114,12 @@ try:  # noqa: SIM105
 except Exception:
     tqdm = None  # type: ignore
 
+# Conditional import of orjson for faster JSON parsing (optional dependency)
+try:  # noqa: SIM105
+    import orjson  # type: ignore
+except Exception:
+    orjson = None  # type: ignore
+
 def log(msg: str) -> None:
     """Print a normal progress/info message."""
     print(msg, flush=True)
@@ -49,6 +133,11 @@ def eprint(msg: str) -> None:
     """Print a warning/error style message to stderr."""
     print(msg, file=sys.stderr, flush=True)
 
+def loads_json(raw: Any) -> Any:
+    """Parses JSON from str or bytes, using orjson when available."""
+    # orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers can catch either
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
 def validate_cookies_file(cookies_path: Path) -> Tuple[bool, str]:
     """Lightweight validation for a Netscape cookies.txt file.
 
@@ -86,41 +175,235 @@ def validate_cookies_file(cookies_path: Path) -> Tuple[bool, str]:
         return False, "Could not find expected YouTube auth cookies (e.g., SAPISID)."
     return True, "Cookies file looks OK."
 
-def find_existing_downloads(library_root: Path) -> Dict[str, Path]:
-    """Scans the library for existing files and maps video IDs to their paths."""
-    vlog("Scanning library for existing downloads...")
-    vids: Dict[str, Path] = {}
-    # Regex to find the 11-char ID in brackets just before the extension
-    id_re = re.compile(r"\[([A-Za-z0-9_-]{11})\]\.[^.]+$")
+def list_library_dir(path: str) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Lists a single library directory.
+    Returns ({video_id: filename} for the downloaded tracks in it, [subdirectory paths]).
+    """
+    found: Dict[str, str] = {}
+    subdirs: List[str] = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.name.endswith(AUDIO_EXTENSIONS) and entry.is_file():
+                        m = LIBRARY_FILE_ID_RE.search(entry.name)
+                        if m and m.group(1) not in found:
+                            found[m.group(1)] = entry.name
+                except OSError:
+                    continue
+    except OSError as e:
+        vlog(f"Skipping unreadable directory {path}: {e}")
+    return found, subdirs
 
-    # Using rglob to find all files in all subdirectories
-    for p in library_root.rglob("*.*"):
-        if not p.is_file():
+def scan_library_tree(root: str, top: str) -> Dict[str, List[Any]]:
+    """
+    Walks one library subdirectory and everything below it.
+    Returns its part of the library index: {directory relative to root: [mtime_ns, {video_id: filename}]}.
+    """
+    index: Dict[str, List[Any]] = {}
+    stack = [top]
+    while stack:
+        d = stack.pop()
+        try:
+            # Taken before listing, so a change made during the scan shows up next run
+            mtime = os.stat(d).st_mtime_ns
+        except OSError:
             continue
+        found, children = list_library_dir(d)
+        index[os.path.relpath(d, root)] = [mtime, found]
+        stack.extend(children)
+    return index
+
+def scan_library(library_root: Path, subdirs: List[str]) -> Dict[str, List[Any]]:
+    """
+    Walks the given library subdirectories, one thread per top-level folder, and
+    merges the results into a single library index.
+    """
+    root = os.fspath(library_root)
+    index: Dict[str, List[Any]] = {}
+    if len(subdirs) <= 1:
+        for d in subdirs:
+            index.update(scan_library_tree(root, d))
+        return index
+    # scandir and stat release the GIL, so directory latency overlaps across threads
+    with ThreadPoolExecutor(max_workers=min(8, len(subdirs))) as ex:
+        for part in ex.map(partial(scan_library_tree, root), subdirs):
+            index.update(part)
+    return index
+
+def refresh_library_index(library_root: Path, index: Dict[str, List[Any]], subdirs: List[str]) -> int:
+    """
+    Brings a saved library index up to date in place and returns how many directories
+    had to be listed again. Adding, removing or renaming a file or folder changes the
+    mtime of its parent directory, so only directories whose mtime changed are re-listed,
+    vanished ones are dropped, and new folders (top-level or inside a changed directory)
+    are walked in full.
+    """
+    root = os.fspath(library_root)
+    new_trees = [d for d in subdirs if os.path.relpath(d, root) not in index]
+    relisted = 0
+    for rel in list(index):
+        d = os.path.join(root, rel)
+        try:
+            mtime = os.stat(d).st_mtime_ns
+        except OSError:
+            del index[rel]
+            continue
+        if mtime == index[rel][0]:
+            continue
+        found, children = list_library_dir(d)
+        index[rel] = [mtime, found]
+        relisted += 1
+        new_trees.extend(c for c in children if os.path.relpath(c, root) not in index)
+    if new_trees:
+        index.update(scan_library(library_root, list(dict.fromkeys(new_trees))))
+    return relisted + len(new_trees)
+
+def valid_index_entry(entry: Any) -> bool:
+    """Checks that a library index entry has the [mtime_ns, {video_id: filename}] shape."""
+    if not (isinstance(entry, list) and len(entry) == 2):
+        return False
+    mtime, found = entry
+    return (
+        isinstance(mtime, int) and not isinstance(mtime, bool)
+        and isinstance(found, dict)
+        and all(isinstance(k, str) and isinstance(v, str) for k, v in found.items())
+    )
 
-        m = id_re.search(p.name)
-        if m:
-            vid = m.group(1)
+def load_library_index(library_root: Path) -> Dict[str, List[Any]]:
+    """
+    Loads the saved library index, or an empty one if missing, unreadable or malformed.
+    A single bad entry discards the whole index: a dropped subfolder would not be noticed
+    while its parent is unchanged, so the library is scanned in full instead.
+    """
+    try:
+        raw = (library_root / INDEX_FILENAME).read_bytes()
+        data = loads_json(raw)
+        dirs = data.get("dirs") if isinstance(data, dict) else None
+        if not isinstance(dirs, dict) or not all(valid_index_entry(e) for e in dirs.values()):
+            return {}
+        return dirs
+    except Exception:
+        return {}
+
+def save_library_index(library_root: Path, index: Dict[str, List[Any]]) -> None:
+    """Writes the library index (non-fatal on failure)."""
+    try:
+        (library_root / INDEX_FILENAME).write_text(json.dumps({"dirs": index}, ensure_ascii=False), encoding="utf-8")
+    except Exception as e:
+        eprint(f"[WARN] Failed to write library index in {library_root}: {e}")
+
+def update_library_index(library_root: Path, index: Dict[str, List[Any]], new_files: Iterable[Path]) -> None:
+    """
+    Records files downloaded during this run in the library index.
+
+    The directories they went into keep the mtime taken when they were scanned (0 for
+    new ones), so the next run lists them again. Stamping them with their current mtime
+    would also vouch for anything else that changed there during the run, such as files
+    deleted by the user or added by a sync tool.
+    """
+    root = os.fspath(library_root)
+    for p in new_files:
+        m = LIBRARY_FILE_ID_RE.search(p.name)
+        rel = os.path.relpath(os.path.dirname(os.fspath(p)), root)
+        if not m or rel == os.curdir or rel.startswith(os.pardir):
+            continue
+        index.setdefault(rel, [0, {}])[1].setdefault(m.group(1), p.name)
+
+def find_existing_downloads(library_root: Path, index: Dict[str, List[Any]], rescan: bool = False) -> Dict[str, Path]:
+    """
+    Finds existing files in the library and maps video IDs to their paths.
+
+    The library root is always listed. Its subdirectories come from the index saved by
+    the previous run, with only the directories that changed since then listed again;
+    without an index (or when `rescan` is set) the whole library is walked. `index` is
+    filled in place so it can be updated and saved later.
+    """
+    root_files, subdirs = list_library_dir(os.fspath(library_root))
+    saved = {} if rescan else load_library_index(library_root)
+    if saved:
+        changed = refresh_library_index(library_root, saved, subdirs)
+        vlog(f"Library index loaded, {changed} changed folder(s) scanned again.")
+        index.update(saved)
+    else:
+        vlog("Scanning library for existing downloads...")
+        index.update(scan_library(library_root, subdirs))
+
+    vids: Dict[str, Path] = {vid: library_root / name for vid, name in root_files.items()}
+    for rel, (_, found) in index.items():
+        for vid, name in found.items():
             if vid not in vids:
-                vids[vid] = p
+                vids[vid] = library_root / rel / name
 
     log(f"Found {len(vids)} existing tracks in the library.")
     return vids
 
 def get_video_id(url: str) -> Optional[str]:
     """Extracts the 11-character video ID from a YouTube URL."""
-    m = re.search(r"(?:youtube\.com|youtu\.be).*?([A-Za-z0-9_-]{11})", url)
+    # Anchored fast path for the usual ?v=ID, &v=ID and youtu.be/ID shapes, so the
+    # backtracking regex below only sees unusual links (/shorts/, /embed/, ...)
+    if url.startswith(YOUTUBE_URL_PREFIXES):
+        for marker in VIDEO_ID_MARKERS:
+            idx = url.find(marker)
+            if idx != -1:
+                start = idx + len(marker)
+                candidate = url[start:start + 11]
+                if len(candidate) == 11 and YOUTUBE_ID_CHARS.issuperset(candidate):
+                    return candidate
+    m = VIDEO_URL_ID_RE.search(url)
     return m.group(1) if m else None
 
+def iter_files(root: Path) -> Iterator[os.DirEntry]:
+    """Recursively yields file entries below root.
+
+    Uses os.scandir so the file type comes from the directory listing itself
+    instead of a stat() per entry. Like Path.rglob, symlinked directories are
+    not descended into.
+    """
+    stack = [os.fspath(root)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file():
+                            yield entry
+                    except OSError:
+                        continue
+        except OSError as e:
+            vlog(f"[WARN] Cannot scan directory: {e}")
+
 def find_json_playlists(root: Path) -> List[Path]:
-    """Finds all .json files in a directory, sorted alphabetically."""
-    return sorted([p for p in root.rglob("*.json") if p.is_file()])
+    """
+    Finds all non-empty .json files in a directory, largest first (ties sorted alphabetically).
+    Starting the biggest playlists first keeps the download pool busy until the end
+    instead of leaving one long playlist running after the small ones have finished.
+    """
+    keyed: List[Tuple[int, str]] = []
+    for entry in iter_files(root):
+        if not entry.name.endswith(".json"):
+            continue
+        try:
+            size = entry.stat().st_size
+        except OSError:
+            size = -1  # Unknown: keep it, the loader reports any problem
+        if size == 0:
+            vlog(f"Skipping empty JSON file: {entry.path}")
+            continue
+        keyed.append((-max(size, 0), entry.path))
+    keyed.sort()
+    return [Path(path) for _, path in keyed]
 
 def load_playlist(json_path: Path) -> Optional[Dict[str, Any]]:
     """Loads a JSON playlist file, returning None if it's invalid."""
     try:
-        with json_path.open("r", encoding="utf-8") as f:
-            data = json.load(f)
+        raw = json_path.read_bytes()
+        data = loads_json(raw)
         # Basic validation
         if isinstance(data, dict) and data.get("type") == "playlist" and isinstance(data.get("tracks"), list):
             return data
@@ -130,6 +413,16 @@ def load_playlist(json_path: Path) -> Optional[Dict[str, Any]]:
         eprint(f"[WARN] Failed to read JSON {json_path}: {e}")
         return None
 
+def load_playlists(json_paths: List[Path]) -> Iterator[Tuple[Path, Optional[Dict[str, Any]]]]:
+    """
+    Loads all playlist files concurrently, yielding (path, playlist) pairs in input order
+    as soon as each one is parsed.
+    """
+    if not json_paths:
+        return
+    with ThreadPoolExecutor(max_workers=min(8, len(json_paths))) as ex:
+        yield from zip(json_paths, ex.map(load_playlist, json_paths))
+
 def maybe_rewrite_to_ytmusic(url: str, prefer_music: bool) -> str:
     """Rewrites a standard YouTube URL to a YouTube Music URL if preferred."""
     if not prefer_music:
@@ -137,45 +430,69 @@ def maybe_rewrite_to_ytmusic(url: str, prefer_music: bool) -> str:
     vid = get_video_id(url)
     return f"https://music.youtube.com/watch?v={vid}" if vid else url
 
-def _add_sleep_flags(cmd: List[str], sleep: Optional[str]) -> None:
-    """Adds sleep-related flags to the yt-dlp command."""
-    s = (sleep or "").strip()
+def parse_sleep(value: str) -> Optional[SleepInterval]:
+    """
+    Parses the --sleep argument once at startup: "N" becomes (N, None) and
+    "MIN,MAX" becomes (MIN, MAX). An empty value disables sleeping.
+    """
+    s = value.strip()
     if not s:
-        return
+        return None
     try:
         if "," in s:
             lo, hi = [float(x.strip()) for x in s.split(",", 1)]
-            cmd.extend(["--min-sleep-interval", str(lo), "--max-sleep-interval", str(hi)])
-        else:
-            cmd.extend(["--sleep-interval", str(float(s))])
+            return lo, hi
+        return float(s), None
     except ValueError:
-        eprint(f"[WARN] Invalid sleep value '{s}'. It must be a number or 'min,max'.")
+        raise argparse.ArgumentTypeError(f"invalid sleep value '{s}'. It must be a number or 'min,max'.")
 
+def parse_sb_categories(value: str) -> Optional[str]:
+    """
+    Parses the --sb-categories argument once at startup into a normalized,
+    de-duplicated comma-separated list. A "-" prefix (exclude) is kept as-is.
+    An empty value falls back to the default categories.
+    """
+    cats = [c.strip().lower() for c in value.split(",") if c.strip()]
+    unknown = [c for c in cats if c.lstrip("-") not in SPONSORBLOCK_CATEGORIES]
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"unknown SponsorBlock categories: {', '.join(unknown)}. "
+            f"Valid: {', '.join(sorted(SPONSORBLOCK_CATEGORIES))}."
+        )
+    return ",".join(dict.fromkeys(cats)) or None
 
-def build_ytdlp_cmd(
-    url: str,
-    outtmpl: str,
+def _add_sleep_flags(cmd: List[str], sleep: Optional[SleepInterval]) -> None:
+    """Adds sleep-related flags to the yt-dlp command."""
+    if not sleep:
+        return
+    lo, hi = sleep
+    if hi is None:
+        cmd.extend(["--sleep-interval", str(lo)])
+    else:
+        cmd.extend(["--min-sleep-interval", str(lo), "--max-sleep-interval", str(hi)])
+
+
+@lru_cache(maxsize=8)
+def ytdlp_base_args(
     audio_format: str,
     audio_quality: Optional[str],
     cookies: Optional[str],
     rate_limit: Optional[str],
-    sleep: Optional[str],
-    prefer_music: bool,
-    dry_run: bool,
+    sleep: Optional[SleepInterval],
     trim_non_music: bool,
     sb_categories: Optional[str],
-) -> List[str]:
-    """Builds the full yt-dlp command as a list of strings."""
-    u = maybe_rewrite_to_ytmusic(url, prefer_music)
-
+    embed_thumbnail: bool,
+) -> Tuple[str, ...]:
+    """
+    Builds the yt-dlp arguments that do not depend on the track.
+    These options are the same for the whole run, so the result is cached.
+    """
     cmd: List[str] = [
         "yt-dlp",
         "--no-playlist",
         "-x",  # Extract audio
         "--audio-format", audio_format,
         "--embed-metadata",
-        "--embed-thumbnail",
-        "--add-metadata",
         # Parse the title from the infojson, remove anything in brackets, and use that for the metadata title.
         # This gives a clean title in the media player while keeping the ID in the filename.
         "--parse-metadata", "title:%(title)s",
@@ -183,13 +500,16 @@ def build_ytdlp_cmd(
         "--no-abort-on-error",
         "--no-overwrites",
         "--print", "after_move:filepath",
-        "-o", outtmpl,
     ]
 
+    if embed_thumbnail:
+        # Costs an extra image fetch and ffmpeg pass per track, so it is opt-in.
+        cmd.append("--embed-thumbnail")
+
     if audio_format.lower() == "mp3" and audio_quality:
         cmd.extend(["--audio-quality", audio_quality])
 
-    if cookies and Path(cookies).is_file():
+    if cookies:
         cmd.extend(["--cookies", cookies])
 
     if rate_limit:
@@ -197,28 +517,52 @@ def build_ytdlp_cmd(
 
     _add_sleep_flags(cmd, sleep)
 
-    if dry_run:
-        cmd.append("--skip-download")
-
     # Add SponsorBlock removal if requested.
     if trim_non_music:
-        cats = (sb_categories or "").strip() or "sponsor,intro,outro,selfpromo,music_offtopic"
-        cmd.extend(["--sponsorblock-remove", cats])
+        cmd.extend(["--sponsorblock-remove", sb_categories or DEFAULT_SB_CATEGORIES])
 
-    cmd.append(u)
+    return tuple(cmd)
+
+
+def build_ytdlp_cmd(
+    url: str,
+    outtmpl: str,
+    audio_format: str,
+    audio_quality: Optional[str],
+    cookies: Optional[str],
+    rate_limit: Optional[str],
+    sleep: Optional[SleepInterval],
+    prefer_music: bool,
+    trim_non_music: bool,
+    sb_categories: Optional[str],
+    embed_thumbnail: bool = False,
+) -> List[str]:
+    """Builds the full yt-dlp command as a list of strings."""
+    u = maybe_rewrite_to_ytmusic(url, prefer_music)
+    cmd = list(ytdlp_base_args(
+        audio_format, audio_quality, cookies, rate_limit, sleep,
+        trim_non_music, sb_categories, embed_thumbnail,
+    ))
+    cmd.extend(["-o", outtmpl, u])
     return cmd
 
 def run_cmd(cmd: List[str]) -> Tuple[int, str, str]:
-    """Executes a command, capturing its output and return code."""
+    """
+    Executes a command, capturing its output and return code.
+    stderr is only decoded when the command fails; on success it is returned empty.
+    """
     try:
-        proc = subprocess.run(cmd, check=False, capture_output=True, text=True, encoding="utf-8")
+        proc = subprocess.run(cmd, check=False, capture_output=True)
+        # stdout holds the printed file path (or search JSON), so decode it like a filename
+        out = os.fsdecode(proc.stdout).strip()
         # The caller is responsible for logging stderr
-        return proc.returncode, proc.stdout.strip(), proc.stderr.strip()
+        err = proc.stderr.decode("utf-8", "replace").strip() if proc.returncode != 0 else ""
+        return proc.returncode, out, err
     except FileNotFoundError:
         eprint("yt-dlp not found. Make sure it is installed and in your PATH.")
         return 127, "", "yt-dlp not found"
     except Exception as e:
-        eprint(f"[ERR] Failed to run command '{' '.join(cmd)}': {e}")
+        eprint(f"[ERR] Failed to run command '{shlex.join(cmd)}': {e}")
         return 1, "", str(e)
 
 def classify_failure(stderr: str) -> str:
@@ -234,15 +578,56 @@ def classify_failure(stderr: str) -> str:
         return FAIL_UNAVAILABLE
     return FAIL_OTHER
 
+def region_hint_codes(stderr: str) -> List[str]:
+    """
+    Returns up to MAX_REGION_RETRIES country codes to retry a region-locked track with,
+    parsed from "This video is available in Country1, Country2." in yt-dlp's stderr.
+    """
+    # The last occurrence skips the "...not made this video available in your country" prefix
+    # Search and slice the same lowercased string; lower() is not length-preserving
+    low = stderr.lower()
+    idx = low.rfind(AVAILABLE_IN_MARKER)
+    if idx == -1:
+        return []
+    tail = low[idx + len(AVAILABLE_IN_MARKER):].split("\n", 1)[0].split(".", 1)[0]
+    codes: List[str] = []
+    for country in tail.split(","):
+        country = country.strip()
+        if not country or country.startswith("your country"):
+            continue
+        code = COUNTRY_NAME_CODES.get(country)
+        if not code:
+            # Heuristic: keep short codes as-is, take the first two letters of a single
+            # word, or the initials of the first two words of a longer name
+            parts = country.split()
+            if len(parts) == 1 and len(parts[0]) <= 3:
+                code = parts[0].upper()
+            elif len(parts) == 1:
+                code = parts[0][:2].upper()
+            else:
+                code = (parts[0][0] + parts[1][0]).upper()
+        # Skip obviously invalid codes
+        if COUNTRY_CODE_RE.fullmatch(code) and code not in codes:
+            codes.append(code)
+            if len(codes) >= MAX_REGION_RETRIES:
+                break
+    return codes
+
+def file_size(path: Any) -> Optional[int]:
+    """Returns the size of a file in bytes, or None if it cannot be read."""
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return None
+
 def download_track(
     url: str,
-    output_dir: Path,
-    playlist_name: str,
+    outtmpl: str,
     audio_format: str,
     audio_quality: Optional[str],
     cookies: Optional[str],
     rate_limit: Optional[str],
-    sleep: Optional[str],
+    sleep: Optional[SleepInterval],
     prefer_youtube_music: bool,
     dry_run: bool,
     trim_non_music: bool,
@@ -250,23 +635,24 @@ def download_track(
     retry_search_if_unavailable: bool,
     original_title: Optional[str],
     fallback_max_results: int,
-) -> Tuple[bool, str, Optional[str], Optional[Path], Optional[str]]:
+    embed_thumbnail: bool = False,
+) -> Tuple[bool, str, Optional[str], Optional[Path], Optional[str], Optional[int]]:
     """Download a single track with optional fallback search.
 
-    Returns (success, url_used, video_id, final_path, error_message).
+    Returns (success, url_used, video_id, final_path, error_message, file_size).
+    The file size is read here, on the worker thread, for the progress ETA.
 
     If the initial download fails with an error containing 'unavailable' and
     retry_search_if_unavailable is True, this function will perform a YouTube
     search (via yt-dlp) using the original_title (if provided) or the URL's
     extracted ID, then attempt to re-download the best-matching candidate.
+
+    `outtmpl` is the yt-dlp output template, shared by every track of a playlist.
+    In a dry run nothing is spawned: the track is reported as successful with no path.
     """
-    # Use yt-dlp's output template for naming. Using the video ID in the filename
-    # helps with deduplication and lookups.
-    outtmpl = str(
-        output_dir
-        / playlist_name
-        / "%(title)s [%(id)s].%(ext)s"
-    )
+    vid = get_video_id(url)
+    if dry_run:
+        return True, url, vid, None, None, None
 
     cmd = build_ytdlp_cmd(
         url=url,
@@ -277,99 +663,58 @@ def download_track(
         rate_limit=rate_limit,
         sleep=sleep,
         prefer_music=prefer_youtube_music,
-        dry_run=dry_run,
         trim_non_music=trim_non_music,
         sb_categories=sb_categories,
+        embed_thumbnail=embed_thumbnail,
     )
     # First attempt (no geo override). We will only add --xff after detecting region restriction.
     rc, final_path_str, stderr = run_cmd(cmd)
-    vid = get_video_id(url)
-    
+
     final_path = Path(final_path_str) if final_path_str and rc == 0 else None
     error_message = f"[yt-dlp stderr] {stderr}" if rc != 0 and stderr else None
 
-    # If region locked and stderr lists countries, attempt sequential retries using first N countries.
-    # Pattern: "This video is available in Country1, Country2, Country3." (we reuse original stderr)
+    # If region locked and stderr lists countries, attempt sequential retries using the first few.
     if rc != 0 and stderr and classify_failure(error_message or "") == FAIL_REGION:
-        # Extract country list after 'available in'
-        m = re.search(r"available in (.+?)(?:\.|$)", stderr, re.IGNORECASE)
-        if m:
-            raw_list = m.group(1)
-            # Split by comma and trim
-            countries = [c.strip() for c in raw_list.split(",") if c.strip()]
-            # Heuristic: map country names to ISO-like codes by taking first word letters
-            # We attempt the first country with an uppercase word of 2+ letters (e.g., 'Canada', 'Poland').
-            # For multi-word like 'United States' we pick 'US'. Basic mapping.
-            tried = 0
-            for country in countries:
-                if tried >= 5:  # Don't loop forever
-                    break
-                # Generate candidate code
-                parts = country.split()
-                if len(parts) == 1 and len(parts[0]) <= 3:
-                    code = parts[0].upper()
-                elif len(parts) == 1:
-                    # Take first two letters
-                    code = parts[0][:2].upper()
-                else:
-                    # Multi-word -> use initials of first two words
-                    code = (parts[0][0] + parts[1][0]).upper()
-                # Skip obviously invalid codes
-                if not re.fullmatch(r"[A-Z]{2,3}", code):
-                    continue
-                tried += 1
-                vlog(f"[REGION] Retrying with X-Forwarded-For country hint: {code}")
-                cmd_geo = build_ytdlp_cmd(
-                    url=url,
-                    outtmpl=outtmpl,
-                    audio_format=audio_format,
-                    audio_quality=audio_quality,
-                    cookies=cookies,
-                    rate_limit=rate_limit,
-                    sleep=sleep,
-                    prefer_music=prefer_youtube_music,
-                    dry_run=dry_run,
-                    trim_non_music=trim_non_music,
-                    sb_categories=sb_categories,
-                )
-                # Inject XFF header code
-                if "--xff" not in cmd_geo:
-                    cmd_geo.insert(1, code)
-                    cmd_geo.insert(1, "--xff")
-                rc_geo, fp_geo, stderr_geo = run_cmd(cmd_geo)
-                if rc_geo == 0 and fp_geo:
-                    vid = get_video_id(url)  # Same video ID
-                    final_path = Path(fp_geo)
-                    error_message = None
-                    rc = 0
-                    stderr = ""
-                    vlog(f"[REGION] Success with country hint {code}")
-                    break
-                else:
-                    vlog(f"[REGION] Failed with {code}: {stderr_geo.splitlines()[-1] if stderr_geo else 'unknown error'}")
+        for code in region_hint_codes(stderr):
+            vlog(f"[REGION] Retrying with X-Forwarded-For country hint: {code}")
+            cmd_geo = build_ytdlp_cmd(
+                url=url,
+                outtmpl=outtmpl,
+                audio_format=audio_format,
+                audio_quality=audio_quality,
+                cookies=cookies,
+                rate_limit=rate_limit,
+                sleep=sleep,
+                prefer_music=prefer_youtube_music,
+                trim_non_music=trim_non_music,
+                sb_categories=sb_categories,
+                embed_thumbnail=embed_thumbnail,
+            )
+            # Inject XFF header code
+            if "--xff" not in cmd_geo:
+                cmd_geo.insert(1, code)
+                cmd_geo.insert(1, "--xff")
+            rc_geo, fp_geo, stderr_geo = run_cmd(cmd_geo)
+            if rc_geo == 0 and fp_geo:
+                final_path = Path(fp_geo)
+                error_message = None
+                rc = 0
+                stderr = ""
+                vlog(f"[REGION] Success with country hint {code}")
+                break
+            else:
+                vlog(f"[REGION] Failed with {code}: {stderr_geo.splitlines()[-1] if stderr_geo else 'unknown error'}")
 
     # Fallback path: search for a replacement if unavailable
     if (
-        not dry_run
-        and retry_search_if_unavailable
+        retry_search_if_unavailable
         and rc != 0
         and error_message
         and classify_failure(error_message) == FAIL_UNAVAILABLE
     ):
         vlog(f"[FALLBACK] '{original_title or url}' reported unavailable. Attempting search for replacement...")
-        expected_duration: Optional[int] = None
-        # Try to probe original metadata (in case infojson still retrievable) to get duration
-        probe_cmd: List[str] = ["yt-dlp", "-j", "--skip-download", url]
-        if cookies and Path(cookies).is_file():
-            probe_cmd += ["--cookies", cookies]
-        prc, pout, perr = run_cmd(probe_cmd)
-        if prc == 0 and pout:
-            try:
-                meta = json.loads(pout.splitlines()[0])
-                if isinstance(meta, dict) and isinstance(meta.get("duration"), int):
-                    expected_duration = meta.get("duration")
-            except Exception:
-                pass
+        # No duration probe: "Video unavailable" is raised during extraction, so a second
+        # yt-dlp run on the same URL fails the same way and never yields the metadata.
         replacement_url = search_for_replacement(
             original_title=original_title,
             failed_url=url,
@@ -378,7 +723,6 @@ def download_track(
             sleep=sleep,
             prefer_music=prefer_youtube_music,
             max_results=fallback_max_results,
-            expected_duration=expected_duration,
         )
         if replacement_url and replacement_url != url:
             vlog(f"[FALLBACK] Trying candidate: {replacement_url}")
@@ -391,36 +735,38 @@ def download_track(
                 rate_limit=rate_limit,
                 sleep=sleep,
                 prefer_music=prefer_youtube_music,
-                dry_run=dry_run,
                 trim_non_music=trim_non_music,
                 sb_categories=sb_categories,
+                embed_thumbnail=embed_thumbnail,
             )
             rc2, fp2, stderr2 = run_cmd(cmd2)
             if rc2 == 0 and fp2:
                 vlog(f"[FALLBACK] Replacement succeeded for '{original_title or url}'.")
                 vid2 = get_video_id(replacement_url)
-                return True, replacement_url, vid2, Path(fp2), None
+                return True, replacement_url, vid2, Path(fp2), None, file_size(fp2)
             else:
                 eprint(f"[FALLBACK-FAIL] Replacement attempt failed: {stderr2}")
         else:
             vlog("[FALLBACK] No viable replacement candidate found.")
-    return rc == 0, url, vid, final_path, error_message
+    size = file_size(final_path) if rc == 0 and final_path else None
+    return rc == 0, url, vid, final_path, error_message, size
 
 def normalize_title_for_search(title: str) -> str:
     """Normalize a title for searching: remove bracketed/parenthetical parts and excessive punctuation."""
-    # Remove content inside brackets or parentheses to generalize the query
-    cleaned = re.sub(r"\s*[\[(].*?[\])]", "", title)
-    cleaned = re.sub(r"[\t\n\r]+", " ", cleaned)
-    cleaned = re.sub(r"\s+", " ", cleaned).strip()
-    return cleaned
+    # One pass: bracketed parts (to generalize the query) and whitespace runs, tabs and
+    # newlines included, all become a single space
+    return TITLE_NOISE_RE.sub(" ", title).strip()
 
 def tokenize(s: str) -> List[str]:
     """Tokenize a string into lowercase alphanumeric words for simple overlap scoring."""
-    return [w for w in re.split(r"[^a-z0-9]+", s.lower()) if w]
+    return [w for w in TOKEN_SPLIT_RE.split(s.lower()) if w]
 
 def score_title_similarity(a: str, b: str) -> float:
     """Compute a simple overlap score between two titles (Jaccard on token sets)."""
-    ta = set(tokenize(a))
+    return score_tokens_similarity(frozenset(tokenize(a)), b)
+
+def score_tokens_similarity(ta: FrozenSet[str], b: str) -> float:
+    """Like score_title_similarity, with the first title already tokenized (reused across candidates)."""
     tb = set(tokenize(b))
     if not ta or not tb:
         return 0.0
@@ -429,15 +775,14 @@ def score_title_similarity(a: str, b: str) -> float:
     return inter / union if union else 0.0
 
 MIN_FALLBACK_DURATION = 40  # seconds
-DURATION_TOLERANCE = 0.25  # ±25%
 
 def is_latin_dominant(title: str) -> bool:
     """Return True if a title is mostly Latin letters (basic ASCII a-z)."""
-    letters = [c for c in title if c.isalpha()]
+    letters = sum(map(str.isalpha, title))
     if not letters:
         return False
-    latin = [c for c in letters if ("a" <= c.lower() <= "z")]  # Basic ASCII only
-    return (len(latin) / len(letters)) >= 0.7
+    latin = len(title) - len(title.translate(ASCII_LETTERS_DELETE))  # Basic ASCII only
+    return (latin / letters) >= 0.7
 
 def title_looks_noise(original_latin: bool, candidate: str) -> bool:
     """Determine if candidate title should be discarded for script/noise when original was Latin."""
@@ -461,36 +806,31 @@ def extract_best_audio_codec(formats: Any) -> Optional[str]:
             return str(ac)
     return None
 
-def duration_within(expected: Optional[int], candidate: Optional[int]) -> bool:
-    """Check duration similarity if expected known; otherwise always True."""
+def duration_long_enough(candidate: Optional[int]) -> bool:
+    """Check that a candidate is at least MIN_FALLBACK_DURATION seconds long."""
     if candidate is None:
         return False  # If we cannot know candidate duration, treat as unsuitable
-    if candidate < MIN_FALLBACK_DURATION:
-        return False
-    if expected is None:
-        return True
-    low = expected * (1 - DURATION_TOLERANCE)
-    high = expected * (1 + DURATION_TOLERANCE)
-    return low <= candidate <= high
+    return candidate >= MIN_FALLBACK_DURATION
 
 def search_for_replacement(
     original_title: Optional[str],
     failed_url: str,
     cookies: Optional[str],
     rate_limit: Optional[str],
-    sleep: Optional[str],
+    sleep: Optional[SleepInterval],
     prefer_music: bool,
     max_results: int = 6,
-    expected_duration: Optional[int] = None,
 ) -> Optional[str]:
     """Search YouTube for a replacement video using yt-dlp JSON output with filtering.
 
     Filtering steps:
     1. Discard candidates without a valid audio codec.
     2. Discard candidates shorter than MIN_FALLBACK_DURATION seconds.
-    3. If expected_duration is known, enforce ± DURATION_TOLERANCE similarity.
-    4. If original title is Latin dominant, discard non-Latin or "Unknown Title" style noise.
-    5. Rank remaining by title similarity.
+    3. If original title is Latin dominant, discard non-Latin or "Unknown Title" style noise.
+    4. Rank remaining by title similarity.
+
+    The original track's duration is not known here (an unavailable video yields no
+    metadata), so candidates are not compared against it.
     """
     failed_vid = get_video_id(failed_url)
     if not original_title and not failed_vid:
@@ -503,7 +843,7 @@ def search_for_replacement(
     search_term = f"ytsearch{max_results}:{query_title}"  # yt-dlp search expression
     cmd: List[str] = ["yt-dlp", "-j", search_term]
     # Add optional common flags
-    if cookies and Path(cookies).is_file():
+    if cookies:
         cmd += ["--cookies", cookies]
     if rate_limit:
         cmd += ["--limit-rate", rate_limit]
@@ -520,7 +860,7 @@ def search_for_replacement(
         if not line:
             continue
         try:
-            obj = json.loads(line)
+            obj = loads_json(line)
             if isinstance(obj, dict) and obj.get("id") and obj.get("title"):
                 # Exclude the failed video id if present
                 if obj.get("id") == failed_vid:
@@ -541,7 +881,7 @@ def search_for_replacement(
         if title_looks_noise(original_latin, title):
             vlog(f"[FALLBACK-FILTER] Reject '{title}' (script/noise)")
             continue
-        if not duration_within(expected_duration, duration):
+        if not duration_long_enough(duration):
             vlog(f"[FALLBACK-FILTER] Reject '{title}' (duration {duration})")
             continue
         if not acodec:
@@ -554,8 +894,9 @@ def search_for_replacement(
         return None
 
     if original_title:
+        query_tokens = frozenset(tokenize(original_title))
         for c in filtered:
-            c["_sim"] = score_title_similarity(original_title, c.get("title", ""))
+            c["_sim"] = score_tokens_similarity(query_tokens, c.get("title", ""))
         filtered.sort(key=lambda x: x.get("_sim", 0.0), reverse=True)
     best = filtered[0]
     new_vid = best.get("id")
@@ -566,114 +907,220 @@ def search_for_replacement(
 
 def write_m3u_for_playlist(library_root: Path, playlist_name: str, files: List[Path]) -> None:
     """Writes an M3U8 playlist file for a given list of tracks."""
-    safe_name = re.sub(r'[\\/*?:"<>|]', "_", playlist_name)
+    safe_name = UNSAFE_FILENAME_RE.sub("_", playlist_name)
     m3u_path = library_root / f"{safe_name}.m3u8"
-
-    # Sort files alphabetically by filename
-    sorted_files = sorted(files, key=lambda p: p.name.lower())
+    tmp_path = m3u_path.with_name(m3u_path.name + ".part")
 
     try:
-        with m3u_path.open("w", encoding="utf-8") as f:
-            f.write("#EXTM3U\n")
-            for p in sorted_files:
-                # M3U paths should be relative to the library root, not the playlist file
-                rel_path = p.relative_to(library_root)
-                f.write(f"{rel_path.as_posix()}\n")
-
+        # M3U paths should be relative to the library root, not the playlist file.
+        # Each entry is paired with its sort key (the lowercased filename) up front,
+        # then sorted alphabetically by filename; ties fall back to the entry itself.
+        root = os.fspath(library_root)
+        keyed = [(p.name.lower(), os.path.relpath(p, root).translate(M3U_SEP_TRANS)) for p in files]
+        keyed.sort()
+        lines = ["#EXTM3U"]
+        lines.extend(entry for _, entry in keyed)
+        # Written in one call to a temporary file and moved into place, so a player
+        # scanning the library never sees a half-written playlist.
+        tmp_path.write_bytes(("\n".join(lines) + "\n").encode("utf-8"))
+        os.replace(tmp_path, m3u_path)
         vlog(f"[M3U] Wrote playlist: {m3u_path}")
     except Exception as e:
         eprint(f"[WARN] Failed to write M3U playlist {m3u_path}: {e}")
+        tmp_path.unlink(missing_ok=True)
+
+def normalize_track(t: Dict[str, Any]) -> Optional[Tuple[str, str, Optional[str]]]:
+    """
+    Returns (url, video_id, title) for a playlist track entry, filling in whichever
+    of the URL or video ID is missing, or None if neither can be determined.
+    """
+    url = t.get("url")
+    vid = t.get("videoId")
 
-def process_playlist(
+    # If we only have a videoId, construct the URL.
+    if vid and not url:
+        url = f"https://www.youtube.com/watch?v={vid}"
+
+    # If we have a URL but no videoId, extract it.
+    if url and not vid:
+        vid = get_video_id(url)
+
+    if not (url and vid):
+        vlog(f"Skipping track with missing URL or videoId: {t.get('title', 'Unknown')}")
+        return None
+    return url, vid, t.get("title")
+
+def plan_playlist(
     playlist_path: Path,
-    out_root: Path,
+    pl: Optional[Dict[str, Any]],
     args: argparse.Namespace,
     downloaded_vids: Dict[str, Path],
-) -> Tuple[int, int, int, List[str]]:
+    queued: Dict[str, str],
+) -> Optional[Dict[str, Any]]:
     """
-    Processes a single playlist file: loads tracks, downloads them, and reports results.
-    Returns a tuple of (success_count, failure_count, skipped_count, failed_urls).
+    Works out what a single loaded playlist needs without downloading anything.
+    Tracks not yet in the library are queued once across all playlists: `queued`
+    maps each video ID to the URL it was first queued with, and only the first
+    playlist to reference a video adds it to its own `jobs`.
+    Returns None if the playlist could not be loaded.
     """
-    pl = load_playlist(playlist_path)
     if not pl:
-        return 0, 0, 0, []
+        return None
 
     playlist_name = pl.get("name", playlist_path.stem)
     if args.remove_videos_suffix and playlist_name.lower().endswith("-videos"):
         playlist_name = playlist_name[:-7].strip()
-        
+
     log(f"\n>>> Processing playlist: {playlist_name}")
 
-    urls_to_download: List[str] = []
-    playlist_track_files: List[Path] = []
+    # Video IDs in playlist order; repeats are downloaded/listed once
+    track_vids: List[str] = []
+    # Video IDs this playlist waits on, whether it queued them itself or not
+    pending_vids: List[str] = []
+    # (video ID, URL, title) of downloads first queued by this playlist
+    jobs: List[Tuple[str, str, Optional[str]]] = []
+    seen_vids: set = set()
     skipped_count = 0
 
-    # Map URL -> title for fallback search context
-    url_title_map: Dict[str, str] = {}
-
-    for t in pl.get("tracks", []):
-        url = t.get("url")
-        vid = t.get("videoId")
-        title = t.get("title")
-
-        # If we only have a videoId, construct the URL.
-        if vid and not url:
-            url = f"https://www.youtube.com/watch?v={vid}"
-        
-        # If we have a URL but no videoId, extract it.
-        if url and not vid:
-            vid = get_video_id(url)
+    tracks = [n for n in map(normalize_track, pl.get("tracks", [])) if n]
+    for url, vid, title in tracks:
+        if vid in seen_vids:
+            vlog(f"Skipping repeated track in '{playlist_name}': {title or url}")
+            continue
+        seen_vids.add(vid)
+        track_vids.append(vid)
 
-        if not (url and vid):
-            vlog(f"Skipping track with missing URL or videoId: {t.get('title', 'Unknown')}")
+        if vid in downloaded_vids:
+            vlog(f"Skipping duplicate track in '{playlist_name}': {title or url}")
+            skipped_count += 1
             continue
 
-        if vid not in downloaded_vids:
-            urls_to_download.append(url)
-            if url and title:
-                url_title_map[url] = title
+        pending_vids.append(vid)
+        if vid not in queued:
+            queued[vid] = url
+            jobs.append((vid, url, title))
         else:
-            vlog(f"Skipping duplicate track in '{playlist_name}': {t.get('title', url)}")
-            skipped_count += 1
-            existing_path = downloaded_vids.get(vid)
-            if existing_path:
-                playlist_track_files.append(existing_path)
+            vlog(f"Track already queued by another playlist: {title or url}")
 
     if skipped_count > 0 and not VERBOSE:
         log(f"Skipped {skipped_count} tracks that already exist.")
 
-    if not urls_to_download:
+    if jobs:
+        log(f"Found {len(jobs)} new tracks.")
+    elif not pending_vids:
         log(f"No new tracks to download in playlist: {playlist_name}")
-        if args.write_m3u and playlist_track_files:
-            write_m3u_for_playlist(out_root, playlist_name, playlist_track_files)
-        return 0, 0, skipped_count, []
 
-    log(f"Found {len(urls_to_download)} new tracks. Starting downloads with concurrency={args.concurrency}...")
-
-    failed_urls: List[str] = []
+    return {
+        "name": playlist_name,
+        "track_vids": track_vids,
+        "pending_vids": pending_vids,
+        "jobs": jobs,
+        "skipped": skipped_count,
+    }
+
+
+def format_eta(seconds: float) -> str:
+    """Formats an ETA in seconds as MM:SS or H:MM:SS, or --:-- if unknown."""
+    if seconds < 0 or seconds == float("inf"):
+        return "--:--"
+    if seconds >= 3600:
+        h = int(seconds // 3600)
+        m = int((seconds % 3600) // 60)
+        s = int(seconds % 60)
+        return f"{h:d}:{m:02d}:{s:02d}"
+    m = int(seconds // 60)
+    s = int(seconds % 60)
+    return f"{m:02d}:{s:02d}"
+
+
+def estimate_eta(elapsed: float, processed: int, total: int, successes: int, downloaded_bytes: int) -> float:
+    """Estimates the seconds left, blending a per-track and a throughput-based estimate."""
+    remaining = total - processed
+    # Time-based ETA
+    eta_time = (elapsed / processed * remaining) if processed else float('inf')
+    # Size/throughput-based ETA (if at least one success and bytes tracked)
+    if successes > 0 and downloaded_bytes > 0 and elapsed > 0:
+        avg_speed = downloaded_bytes / elapsed  # bytes per second
+        avg_size_per_track = downloaded_bytes / successes
+        remaining_bytes = avg_size_per_track * remaining
+        if avg_speed > 0:
+            eta_size = remaining_bytes / avg_speed
+            # Blend: prefer size-based but fall back to time-based if wildly off
+            return min(max(eta_size, 0), eta_time * 3) if processed > 1 else eta_size
+    return eta_time
+
+
+def download_all(
+    plans: Iterable[Dict[str, Any]],
+    out_root: Path,
+    args: argparse.Namespace,
+    downloaded_vids: Dict[str, Path],
+) -> Tuple[List[Dict[str, Any]], Dict[str, Path], Dict[str, str]]:
+    """
+    Downloads the queued tracks of every playlist through one shared thread pool,
+    so workers never sit idle waiting for a playlist to finish. Each plan's tracks
+    are submitted as soon as the plan is produced, so downloads start while later
+    playlists are still being loaded.
+    Returns (plans, files, failed): the consumed plans, the downloaded file per
+    queued video ID, and the URL per queued video ID that could not be downloaded.
+    """
+    consumed: List[Dict[str, Any]] = []
+    files: Dict[str, Path] = {}
+    failed: Dict[str, str] = {}
     download_errors: List[str] = []
+    # Options shared by every download of the run are bound once.
+    run_download = partial(
+        download_track,
+        audio_format=args.audio_format,
+        audio_quality=args.quality,
+        cookies=args.cookies,
+        rate_limit=args.rate_limit,
+        sleep=args.sleep,
+        prefer_youtube_music=args.prefer_youtube_music,
+        dry_run=args.dry_run,
+        trim_non_music=args.trim_non_music,
+        sb_categories=args.sb_categories,
+        retry_search_if_unavailable=args.retry_search_if_unavailable,
+        fallback_max_results=args.fallback_max_results,
+        embed_thumbnail=args.thumbnails,
+    )
     with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as ex:
-        futs = {
-            ex.submit(
-                download_track,
-                url=url,
-                output_dir=out_root,
-                playlist_name=playlist_name,
-                audio_format=args.audio_format,
-                audio_quality=args.quality,
-                cookies=args.cookies,
-                rate_limit=args.rate_limit,
-                sleep=args.sleep,
-                prefer_youtube_music=args.prefer_youtube_music,
-                dry_run=args.dry_run,
-                trim_non_music=args.trim_non_music,
-                sb_categories=args.sb_categories,
-                retry_search_if_unavailable=args.retry_search_if_unavailable,
-                original_title=url_title_map.get(url),
-                fallback_max_results=args.fallback_max_results,
-            ): url
-            for url in urls_to_download
-        }
+        futs: Dict[Future, str] = {}
+        # Playlists still waiting on each queued video ID, and how many tracks each one
+        # is still waiting for. A playlist's M3U is written as soon as its count drops
+        # to zero, so finished playlists do not wait for the whole run.
+        waiting: Dict[str, List[Dict[str, Any]]] = {}
+        tracks_left: Dict[int, int] = {}
+        for plan in plans:
+            consumed.append(plan)
+            if plan["pending_vids"]:
+                tracks_left[id(plan)] = len(plan["pending_vids"])
+                for vid in plan["pending_vids"]:
+                    waiting.setdefault(vid, []).append(plan)
+            elif args.write_m3u:
+                write_playlist_m3u(plan, out_root, downloaded_vids, files)
+            # Fully downloaded (or fully queued elsewhere) playlists need no folder or template
+            if not plan["jobs"]:
+                continue
+            # Use yt-dlp's output template for naming. Using the video ID in the filename
+            # helps with deduplication and lookups. It is the same for every track of a playlist.
+            # The folder is sanitized like the M3U name, and any "%" in it is escaped so
+            # yt-dlp does not read it as a template field.
+            playlist_dir = os.path.join(out_root, UNSAFE_FILENAME_RE.sub("_", plan["name"]))
+            outtmpl = os.path.join(playlist_dir.replace("%", "%%"), "%(title)s [%(id)s].%(ext)s")
+            if not args.dry_run:
+                # Created once here rather than racing between concurrent yt-dlp processes
+                try:
+                    os.makedirs(playlist_dir, exist_ok=True)
+                except OSError as e:
+                    eprint(f"[WARN] Could not create playlist folder {playlist_dir}: {e}")
+            for queued_vid, url, title in plan["jobs"]:
+                futs[ex.submit(run_download, url=url, outtmpl=outtmpl, original_title=title)] = queued_vid
+
+        total_tasks = len(futs)
+        if not total_tasks:
+            return consumed, files, failed
+        log(f"\nDownloading {total_tasks} tracks with concurrency={args.concurrency}...")
 
         # Add a progress bar if tqdm is installed
         iterator = as_completed(futs)
@@ -681,71 +1128,86 @@ def process_playlist(
         downloaded_bytes = 0
         success_count_so_far = 0
         if tqdm:
-            desc = f"Downloading '{playlist_name}'"
+            desc = "Downloading"
             # Custom bar format: show n/total and postfix (ETA + failures)
             bar_format = "{l_bar}{bar}| {n_fmt}/{total_fmt} [{postfix}]"
-            pbar = tqdm(iterator, total=len(futs), desc=desc, unit="song", leave=True, bar_format=bar_format)
+            pbar = tqdm(iterator, total=total_tasks, desc=desc, unit="song", leave=True, bar_format=bar_format)
             pbar.set_postfix_str("ETA --:-- | failed: 0")
             iterator = pbar
 
         failed_count = 0
-        total_tasks = len(futs)
-
-        def _fmt_eta(seconds: float) -> str:
-            if seconds < 0 or seconds == float("inf"):
-                return "--:--"
-            if seconds >= 3600:
-                h = int(seconds // 3600)
-                m = int((seconds % 3600) // 60)
-                s = int(seconds % 60)
-                return f"{h:d}:{m:02d}:{s:02d}"
-            m = int(seconds // 60)
-            s = int(seconds % 60)
-            return f"{m:02d}:{s:02d}"
+        last_postfix = 0.0
 
         for f in iterator:
-            ok, url, vid, final_path, error_message = f.result()
-            if ok and vid and final_path:
+            queued_vid = futs[f]
+            ok, url, vid, final_path, error_message, size = f.result()
+            if ok and vid and (final_path or args.dry_run):
                 success_count_so_far += 1
-                downloaded_vids[vid] = final_path
-                playlist_track_files.append(final_path)
-                try:
-                    downloaded_bytes += final_path.stat().st_size
-                except Exception:
-                    pass
+                if final_path:
+                    downloaded_vids[vid] = final_path
+                    # Keyed by the queued ID, which differs from `vid` for fallback replacements
+                    files[queued_vid] = final_path
+                    downloaded_bytes += size or 0
             else:
-                failed_urls.append(url)
+                failed[queued_vid] = url
                 failed_count += 1
                 if error_message:
                     download_errors.append(error_message)
 
+            for plan in waiting.pop(queued_vid, ()):
+                tracks_left[id(plan)] -= 1
+                if not tracks_left[id(plan)] and args.write_m3u:
+                    write_playlist_m3u(plan, out_root, downloaded_vids, files)
+
             if tqdm:
                 processed = success_count_so_far + failed_count
-                remaining = total_tasks - processed
-                elapsed = time.time() - start_time
-                # Time-based ETA
-                eta_time = (elapsed / processed * remaining) if processed else float('inf')
-                # Size/throughput-based ETA (if at least one success and bytes tracked)
-                if success_count_so_far > 0 and downloaded_bytes > 0 and elapsed > 0:
-                    avg_speed = downloaded_bytes / elapsed  # bytes per second
-                    avg_size_per_track = downloaded_bytes / success_count_so_far
-                    remaining_bytes = avg_size_per_track * remaining
-                    if avg_speed > 0:
-                        eta_size = remaining_bytes / avg_speed
-                        # Blend: prefer size-based but fall back to time-based if wildly off
-                        eta = min(max(eta_size, 0), eta_time * 3) if processed > 1 else eta_size
-                    else:
-                        eta = eta_time
-                else:
-                    eta = eta_time
-                pbar.set_postfix_str(f"ETA {_fmt_eta(eta)} | failed: {failed_count}")
+                now = time.time()
+                # tqdm redraws at a limited rate anyway, so skip the ETA work in between
+                if now - last_postfix >= PROGRESS_UPDATE_INTERVAL or processed == total_tasks:
+                    last_postfix = now
+                    eta = estimate_eta(
+                        now - start_time, processed, total_tasks, success_count_so_far, downloaded_bytes
+                    )
+                    pbar.set_postfix_str(f"ETA {format_eta(eta)} | failed: {failed_count}")
 
     # After the progress bar is finished, print any errors that occurred.
     if download_errors:
         for err in download_errors:
             eprint(err)
 
-    success_count = len(urls_to_download) - len(failed_urls)
+    return consumed, files, failed
+
+
+def write_playlist_m3u(
+    plan: Dict[str, Any],
+    out_root: Path,
+    downloaded_vids: Dict[str, Path],
+    files: Dict[str, Path],
+) -> None:
+    """Writes the M3U of a planned playlist from the tracks that are on disk so far."""
+    playlist_track_files = [
+        p for p in (files.get(vid) or downloaded_vids.get(vid) for vid in plan["track_vids"]) if p
+    ]
+    if playlist_track_files:
+        write_m3u_for_playlist(out_root, plan["name"], playlist_track_files)
+
+
+def finish_playlist(
+    plan: Dict[str, Any],
+    failed: Dict[str, str],
+) -> Tuple[int, int, int, List[str]]:
+    """
+    Reports the results of a planned playlist. Its M3U has already been written by
+    download_all. Tracks downloaded on behalf of an earlier playlist count as skipped here.
+    Returns a tuple of (success_count, failure_count, skipped_count, failed_urls).
+    """
+    playlist_name = plan["name"]
+    own_vids = {vid for vid, _, _ in plan["jobs"]}
+    failed_urls = [failed[vid] for vid in plan["pending_vids"] if vid in failed]
+    success_count = sum(1 for vid in own_vids if vid not in failed)
+    skipped_count = plan["skipped"] + sum(
+        1 for vid in plan["pending_vids"] if vid not in own_vids and vid not in failed
+    )
     log(f"Playlist '{playlist_name}' summary: {success_count} downloaded, {len(failed_urls)} failed, {skipped_count} skipped.")
 
     if failed_urls:
@@ -753,9 +1215,6 @@ def process_playlist(
         for url in failed_urls:
             eprint(f"    - {url}")
 
-    if args.write_m3u and playlist_track_files:
-        write_m3u_for_playlist(out_root, playlist_name, playlist_track_files)
-
     return success_count, len(failed_urls), skipped_count, failed_urls
 
 
@@ -767,26 +1226,35 @@ def main() -> int:
     )
     ap.add_argument("takeout_path", help="Path to folder containing Takeout JSON and/or CSV files.")
     ap.add_argument("-o", "--output-dir", default="/library", help="Output library directory.")
-    ap.add_argument("--audio-format", default="m4a", choices=["flac", "alac", "wav", "aiff", "opus", "vorbis", "aac", "m4a", "mp3", "ac4", "eac3", "ac3", "dts"], help="Output audio format.")
+    ap.add_argument("--audio-format", default="m4a", choices=AUDIO_FORMATS, help="Output audio format.")
     ap.add_argument("--quality", default="0", help="For MP3, VBR quality from 0 (best) to 9 (worst).")
-    ap.add_argument("--concurrency", type=int, default=2, help="Number of parallel downloads.")
+    ap.add_argument("--concurrency", type=int, default=None, help="Number of parallel downloads. Default: half the usable CPUs, between 2 and 8.")
     ap.add_argument("--prefer-youtube-music", action="store_true", help="Rewrite video URLs to music.youtube.com for better metadata.")
+    ap.add_argument("--thumbnails", action="store_true", help="Embed the video thumbnail as cover art (one extra fetch and ffmpeg pass per track).")
     ap.add_argument("--write-m3u", action="store_true", help="Write M3U8 playlists for each playlist.")
     ap.add_argument("--rate-limit", help="Limit download rate (e.g., '1M' for 1MB/s).")
-    ap.add_argument("--sleep", help='Sleep between downloads: "N" for fixed seconds, or "MIN,MAX" for a random range.')
+    ap.add_argument("--sleep", type=parse_sleep, help='Sleep between downloads: "N" for fixed seconds, or "MIN,MAX" for a random range.')
     ap.add_argument("--cookies", help="Path to a cookies.txt file (Netscape format) for private/gated content.")
     ap.add_argument("--dry-run", action="store_true", help="Simulate the process without downloading any files.")
     ap.add_argument("--remove-videos-suffix", action="store_true", help="Remove '-videos' suffix from playlist names.")
     ap.add_argument("--trim-non-music", action="store_true", help="Trim non-music segments using SponsorBlock (requires network access to API via yt-dlp).")
-    ap.add_argument("--sb-categories", help="Comma-separated SponsorBlock categories to remove. Default: sponsor,intro,outro,selfpromo,music_offtopic")
+    ap.add_argument("--sb-categories", type=parse_sb_categories, help=f"Comma-separated SponsorBlock categories to remove. Default: {DEFAULT_SB_CATEGORIES}")
     ap.add_argument("--retry-search-if-unavailable", action="store_true", help="On 'video unavailable' errors, search YouTube for a likely replacement and retry once.")
     ap.add_argument("--fallback-max-results", type=int, default=6, help="Max search results to consider for a fallback replacement.")
+    ap.add_argument("--rescan", action="store_true", help="Ignore the saved library index and scan every library folder for existing downloads.")
     ap.add_argument("-v", "--verbose", action="store_true", help="Enable verbose output, e.g., for skipped tracks.")
 
     args = ap.parse_args()
     global VERBOSE
     VERBOSE = args.verbose
 
+    if not args.concurrency:
+        # Downloads are bandwidth-bound, not CPU-bound: half the usable CPUs leaves room
+        # for ffmpeg post-processing, and past 8 workers extra downloads mostly add
+        # rate-limit backoff (and slow retries) rather than throughput.
+        cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 4)
+        args.concurrency = min(8, max(2, cpus // 2))
+
     takeout_path = Path(args.takeout_path).resolve()
     out_root = Path(args.output_dir).resolve()
     out_root.mkdir(parents=True, exist_ok=True)
@@ -796,7 +1264,8 @@ def main() -> int:
         return 2
 
     # Pre-scan the library to find tracks that have already been downloaded.
-    downloaded_vids = find_existing_downloads(out_root)
+    library_index: Dict[str, List[Any]] = {}
+    downloaded_vids = find_existing_downloads(out_root, library_index, rescan=args.rescan)
 
     # Validate cookies file (non-fatal if invalid)
     if args.cookies:
@@ -805,6 +1274,12 @@ def main() -> int:
             log(f"[COOKIES] {msg}")
         else:
             eprint(f"[COOKIES] {msg}")
+        # Checked and resolved once here so the per-track commands can pass the path through as-is.
+        if Path(args.cookies).is_file():
+            args.cookies = str(Path(args.cookies).resolve())
+        else:
+            eprint("[COOKIES] Continuing without cookies.")
+            args.cookies = None
 
     json_paths = find_json_playlists(takeout_path)
     if not json_paths:
@@ -814,18 +1289,30 @@ def main() -> int:
 
     log(f"Found {len(json_paths)} JSON playlist(s) to process.")
     total_success = 0
-    total_failures = 0
     total_skipped = 0
     all_failed_urls: List[str] = []
     # This dictionary tracks all downloaded video IDs and their file paths across all playlists
     # It is pre-populated by the scan above.
 
-    for jp in json_paths:
-        s, f, sk, failed_urls = process_playlist(jp, out_root, args, downloaded_vids)
+    # Each playlist is planned and its tracks submitted as soon as it is parsed.
+    queued: Dict[str, str] = {}
+    planned = (plan_playlist(jp, pl, args, downloaded_vids, queued) for jp, pl in load_playlists(json_paths))
+
+    # Downloads for all playlists share one pool; results are reported per playlist afterwards.
+    plans, files, failed = download_all((plan for plan in planned if plan), out_root, args, downloaded_vids)
+    # A dry run downloads nothing, so it leaves the library (and its index) untouched
+    if not args.dry_run:
+        update_library_index(out_root, library_index, files.values())
+        save_library_index(out_root, library_index)
+    if plans:
+        log("")
+    for plan in plans:
+        s, _, sk, failed_urls = finish_playlist(plan, failed)
         total_success += s
-        total_failures += f
         total_skipped += sk
         all_failed_urls.extend(failed_urls)
+    # A track shared by several playlists fails once per playlist; count and log each URL once
+    unique_failed_urls = list(dict.fromkeys(all_failed_urls))
 
     log("\n" + "="*40)
     log("           DOWNLOAD SUMMARY")
@@ -833,22 +1320,20 @@ def main() -> int:
     log(f"Total playlists processed: {len(json_paths)}")
     log(f"Total unique tracks downloaded: {total_success}")
     log(f"Total tracks skipped (already exist): {total_skipped}")
-    log(f"Total failures: {total_failures}")
+    log(f"Total failures (unique tracks): {len(unique_failed_urls)}")
     log("="*40)
 
-    if all_failed_urls:
+    if unique_failed_urls:
         failure_log_path = takeout_path / "failed_downloads.log"
         try:
-            with failure_log_path.open("w", encoding="utf-8") as f:
-                f.write("# Failed Downloads\n\n")
-                f.write("The following URLs failed to download:\n")
-                for url in all_failed_urls:
-                    f.write(f"- {url}\n")
-            eprint(f"\n[INFO] A log of {total_failures} failed downloads was written to: {failure_log_path}")
+            lines = ["# Failed Downloads", "", "The following URLs failed to download:"]
+            lines.extend(f"- {url}" for url in unique_failed_urls)
+            failure_log_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+            eprint(f"\n[INFO] A log of {len(unique_failed_urls)} failed downloads was written to: {failure_log_path}")
         except Exception as e:
             eprint(f"\n[ERROR] Could not write failure log: {e}")
 
-        eprint(f"\n[DONE] Completed with {total_failures} total failure(s).")
+        eprint(f"\n[DONE] Completed with {len(unique_failed_urls)} total failure(s).")
         return 1
     else:
         log("\n[DONE] All downloads completed successfully.")